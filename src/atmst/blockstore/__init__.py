@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Optional, Dict
+from typing import Optional, Dict, Iterable, Tuple, List
 import sqlite3
 
+from lru import LRU
+
 
 class BlockStore(ABC):
 	"""
@@ -31,6 +33,44 @@ class BlockStore(ABC):
 	def del_block(self, key: bytes) -> None:
 		pass
 
+	def put_blocks(self, blocks: Iterable[Tuple[bytes, bytes]]) -> None:
+		"""
+		put() lots of (key, value) pairs at once.
+		Subclasses may override this with something more efficient.
+		"""
+		for key, value in blocks:
+			self.put_block(key, value)
+
+	def get_blocks(self, keys: Iterable[bytes]) -> Dict[bytes, bytes]:
+		"""
+		get() lots of keys at once, returning a key -> value dict.
+		Like get(), you get a KeyError if any of them don't exist.
+		Subclasses may override this with something more efficient.
+		"""
+		return {key: self.get_block(key) for key in keys}
+
+	def contains_block(self, key: bytes) -> bool:
+		"""
+		check whether a block exists, without raising KeyError if it doesn't.
+		Subclasses may override this with something more efficient.
+		"""
+		try:
+			self.get_block(key)
+		except KeyError:
+			return False
+		return True
+
+	def _get_block_or_none(self, key: bytes) -> Optional[bytes]:
+		"""
+		like get(), but returns None rather than raising KeyError if the block doesn't exist
+		(for callers that expect misses, e.g. OverlayBlockStore).
+		Subclasses may override this with something more efficient.
+		"""
+		try:
+			return self.get_block(key)
+		except KeyError:
+			return None
+
 
 class MemoryBlockStore(BlockStore):
 	_state = Dict[bytes, bytes]
@@ -42,18 +82,21 @@ class MemoryBlockStore(BlockStore):
 		self._state = dict() if state is None else state
 	
 	def put_block(self, key: bytes, value: bytes) -> None:
-		existing_value = self._state.get(key)
-		if existing_value:
-			if existing_value == value:
-				return  # the value matches, there's nothing to do
+		existing_value = self._state.setdefault(key, value)
+		if existing_value is not value and existing_value != value:
 			raise ValueError("block values are immutable")
-		self._state[key] = value
 	
 	def get_block(self, key: bytes) -> bytes:
 		value = self._state.get(key)
 		if value is None:
 			raise KeyError("no block matches this key")
 		return value
+
+	def contains_block(self, key: bytes) -> bool:
+		return key in self._state
+
+	def _get_block_or_none(self, key: bytes) -> Optional[bytes]:
+		return self._state.get(key)
 	
 	def del_block(self, key: bytes) -> None:
 		if key in self._state:
@@ -64,30 +107,105 @@ class SqliteBlockStore(BlockStore):
 	"""
 	NB: Caller is responsible for calling commit(), etc.
 	TODO: consider allowing a custom table name?
+
+	If cache_size is set, recently read blocks are kept in an in-memory LRU cache
+	(of up to cache_size entries). This is off by default, since a cached block
+	can outlive a rollback of the transaction that inserted it, or a deletion made
+	via some other connection/BlockStore instance.
+
+	If tune is set, some performance-oriented PRAGMAs get applied to the connection
+	(WAL mode, synchronous=NORMAL, etc.). This is off by default, since they
+	affect the whole connection/database and not just our table.
 	"""
-	def __init__(self, con: sqlite3.Connection, table: str="mst_blocks") -> None:
+	GET_BLOCKS_CHUNK_SIZE = 500 # stay well below SQLITE_MAX_VARIABLE_NUMBER (999 on older versions)
+
+	TUNING_PRAGMAS = [
+		"PRAGMA journal_mode=WAL",
+		"PRAGMA synchronous=NORMAL", # safe in WAL mode, but a power loss may roll back recent commits
+		"PRAGMA temp_store=MEMORY",
+		"PRAGMA mmap_size=268435456", # 256MiB
+	]
+
+	def __init__(self, con: sqlite3.Connection, table: str="mst_blocks", cache_size: int=0, tune: bool=False) -> None:
 		self.table = table
+		self._cache = LRU(cache_size) if cache_size else None
 		self._cur = con.cursor()
+		if tune:
+			for pragma in self.TUNING_PRAGMAS:
+				self._cur.execute(pragma)
 		self._cur.execute(f"""
 			CREATE TABLE IF NOT EXISTS {self.table} (
 				block_key BLOB PRIMARY KEY,
 				block_val BLOB NOT NULL
 			) WITHOUT ROWID;
 		""")
+
+		# build the query strings once, rather than on every call
+		self._put_sql = f"INSERT OR IGNORE INTO {self.table} (block_key, block_val) VALUES (?, ?)"
+		self._get_sql = f"SELECT block_val FROM {self.table} WHERE block_key=?"
+		self._has_sql = f"SELECT 1 FROM {self.table} WHERE block_key=? LIMIT 1"
+		self._del_sql = f"DELETE FROM {self.table} WHERE block_key=?"
 	
 	def put_block(self, key: bytes, value: bytes) -> None:
 		# XXX: this will fail silently if the key already exists but with a different value
 		# (that should never happen but it'd be nice to have guard rails)
-		self._cur.execute(f"INSERT OR IGNORE INTO {self.table} (block_key, block_val) VALUES (?, ?)", (key, value))
+		self._cur.execute(self._put_sql, (key, value))
+
+	def put_blocks(self, blocks: Iterable[Tuple[bytes, bytes]]) -> None:
+		# XXX: same caveat as put_block()
+		self._cur.executemany(self._put_sql, blocks)
 	
 	def get_block(self, key: bytes) -> bytes:
-		row = self._cur.execute(f"SELECT block_val FROM {self.table} WHERE block_key=?", (key,)).fetchone()
-		if row is None:
+		value = self._get_block_or_none(key)
+		if value is None:
 			raise KeyError("no block matches this key")
+		return value
+
+	def _get_block_or_none(self, key: bytes) -> Optional[bytes]:
+		if self._cache is not None:
+			value = self._cache.get(key)
+			if value is not None:
+				return value
+		row = self._cur.execute(self._get_sql, (key,)).fetchone()
+		if row is None:
+			return None
+		if self._cache is not None:
+			self._cache[key] = row[0]
 		return row[0]
+
+	def get_blocks(self, keys: Iterable[bytes]) -> Dict[bytes, bytes]:
+		res: Dict[bytes, bytes] = {}
+		missing: List[bytes] = []
+		for key in dict.fromkeys(keys): # dedupe
+			value = None if self._cache is None else self._cache.get(key)
+			if value is None:
+				missing.append(key)
+			else:
+				res[key] = value
+		# one query per chunk of keys, rather than one per key
+		for i in range(0, len(missing), self.GET_BLOCKS_CHUNK_SIZE):
+			chunk = missing[i:i + self.GET_BLOCKS_CHUNK_SIZE]
+			placeholders = ",".join("?" * len(chunk))
+			for key, value in self._cur.execute(
+				f"SELECT block_key, block_val FROM {self.table} WHERE block_key IN ({placeholders})",
+				chunk
+			):
+				res[key] = value
+				if self._cache is not None:
+					self._cache[key] = value
+		if any(key not in res for key in missing):
+			raise KeyError("no block matches this key")
+		return res
+
+	def contains_block(self, key: bytes) -> bool:
+		if self._cache is not None and key in self._cache:
+			return True
+		return self._cur.execute(self._has_sql, (key,)).fetchone() is not None
 	
 	def del_block(self, key: bytes) -> None:
-		self._cur.execute(f"DELETE FROM {self.table} WHERE block_key=?", (key,))
+		if self._cache is not None:
+			self._cache.pop(key, None)
+		self._cur.execute(self._del_sql, (key,))
 
 
 class OverlayBlockStore(BlockStore):
@@ -102,12 +220,25 @@ class OverlayBlockStore(BlockStore):
 	
 	def put_block(self, key: bytes, value: bytes) -> None:
 		self.upper.put_block(key, value)
+
+	def put_blocks(self, blocks: Iterable[Tuple[bytes, bytes]]) -> None:
+		self.upper.put_blocks(blocks)
 	
 	def get_block(self, key: bytes) -> bytes:
-		try:
-			return self.upper.get_block(key)
-		except KeyError:
+		# a single probe of upper, without paying for a raised KeyError on every miss
+		value = self.upper._get_block_or_none(key)
+		if value is None:
 			return self.lower.get_block(key)
+		return value
+
+	def _get_block_or_none(self, key: bytes) -> Optional[bytes]:
+		value = self.upper._get_block_or_none(key)
+		if value is None:
+			return self.lower._get_block_or_none(key)
+		return value
+
+	def contains_block(self, key: bytes) -> bool:
+		return self.upper.contains_block(key) or self.lower.contains_block(key)
 	
 	def del_block(self, key: bytes) -> None:
 		self.upper.del_block(key)
@@ -1,29 +1,79 @@
-from typing import Dict, List, Tuple, BinaryIO
+from typing import Dict, List, Tuple, BinaryIO, Union, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
+import mmap
+import os
 
 from cbrrr import decode_dag_cbor, CID
 
 from . import BlockStore
 
 # should be equivalent to multiformats.varint.decode(), but not extremely slow for no reason.
-def decode_varint(stream: BinaryIO):
-	n = 0
-	for shift in range(0, 63, 7):
-		val = stream.read(1)
+# accepts either a stream, or an in-memory buffer (decoded from the start, without copying)
+def decode_varint(stream: Union[BinaryIO, bytes, bytearray, memoryview]) -> int:
+	if isinstance(stream, (bytes, bytearray, memoryview)):
+		return decode_varint_at(stream, 0)[0]
+	read = stream.read
+	val = read(1)
+	if not val:
+		raise ValueError("unexpected end of varint input")
+	n = val[0]
+	if n < 0x80:
+		return n # fast path for single-byte varints
+	val = read(1)
+	if not val:
+		raise ValueError("unexpected end of varint input")
+	val = val[0]
+	n = (n & 0x7f) | ((val & 0x7f) << 7)
+	if val < 0x80: # fast path for two-byte varints (e.g. most CAR block lengths)
+		if not val:
+			raise ValueError("varint not minimally encoded")
+		return n
+	for shift in range(14, 63, 7):
+		val = read(1)
 		if not val:
 			raise ValueError("unexpected end of varint input")
 		val = val[0]
 		n |= (val & 0x7f) << shift
 		if not val & 0x80:
-			if shift and not val:
+			if not val:
 				raise ValueError("varint not minimally encoded")
 			return n
-		shift += 7
+	raise ValueError("varint too long")
+
+# like decode_varint, but reads from an in-memory buffer (e.g. an mmap) starting at offset,
+# returning (value, new_offset) so that the caller can keep parsing from there
+def decode_varint_at(buf: Union[bytes, bytearray, memoryview, mmap.mmap], offset: int=0) -> Tuple[int, int]:
+	if offset + 1 < len(buf):
+		n = buf[offset]
+		if n < 0x80:
+			return n, offset + 1 # fast path for single-byte varints
+		val = buf[offset + 1]
+		if 0 < val < 0x80: # fast path for (minimally encoded) two-byte varints
+			return (n & 0x7f) | (val << 7), offset + 2
+	n = 0
+	for shift in range(0, 63, 7):
+		if offset >= len(buf):
+			raise ValueError("unexpected end of varint input")
+		val = buf[offset]
+		offset += 1
+		n |= (val & 0x7f) << shift
+		if not val & 0x80:
+			if shift and not val:
+				raise ValueError("varint not minimally encoded")
+			return n, offset
 	raise ValueError("varint too long")
 
 def encode_varint(n: int) -> bytes:
 	if not 0 <= n < 2**63:
 		raise ValueError("integer out of encodable varint range")
+	# fast paths for the common short lengths
+	if n < 0x80:
+		return bytes((n,))
+	if n < 0x4000:
+		return bytes((0x80 | (n & 0x7f), n >> 7))
+	if n < 0x200000:
+		return bytes((0x80 | (n & 0x7f), 0x80 | ((n >> 7) & 0x7f), n >> 14))
 	res = []
 	while n > 0x7f:
 		res.append(0x80 | (n & 0x7f))
@@ -36,25 +86,45 @@ class ReadOnlyCARBlockStore(BlockStore):
 	This is a sliiiightly unclean abstraction because BlockStores are indexed
 	by `bytes` rather than CID, but same idea. This is convenient for verifying
 	proofs provided in CAR format, and for testing.
+
+	Where possible, the file gets mmap'd (otherwise, it's read into memory in full).
+	Call close() (or use this as a context manager) to release the mapping - the
+	file itself is still the caller's responsibility to close.
+
+	NB: if the file gets truncated while it's mapped, reading from the missing
+	part will crash the whole process with SIGBUS (rather than raising EOFError).
 	"""
 
 	car_root: CID
 	block_offsets: Dict[bytes, Tuple[int, int]] # CID -> (offset, length)
+	verified: Set[bytes] # CIDs of blocks whose hashes we've already checked
 
 	def __init__(self, file: BinaryIO, validate_hashes: bool=True) -> None:
 		"""
 		pre-scan over the whole file, recording the offsets of each block
 		"""
 
-		self.file = file
+		self.file = file # no longer read from after this, but kept for backwards compatibility
 		self.validate_hashes = validate_hashes
-		file.seek(0)
+		self.verified = set()
+
+		# map the whole file into memory, so we can index into it directly
+		# (rather than doing a seek+read for every little thing)
+		try:
+			self.buf = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		except (AttributeError, OSError, ValueError):
+			# not a "real" file (e.g. BytesIO), or an empty one - just read the whole thing
+			# (NB: io.UnsupportedOperation is a subclass of OSError)
+			file.seek(0)
+			self.buf = file.read()
+		buf = self.buf
 
 		# parse out CAR header
-		header_len = decode_varint(file)
-		header = file.read(header_len)
+		header_len, offset = decode_varint_at(buf, 0)
+		header = buf[offset:offset + header_len]
 		if len(header) != header_len:
 			raise EOFError("not enough CAR header bytes")
+		offset += header_len
 		header_obj = decode_dag_cbor(header)
 		if header_obj.get("version") != 1:
 			raise ValueError(f"unsupported CAR version ({header_obj.get('version')})")
@@ -66,33 +136,78 @@ class ReadOnlyCARBlockStore(BlockStore):
 		self.block_offsets = {}
 		while True:
 			try:
-				length = decode_varint(file)
+				length, start = decode_varint_at(buf, offset)
 			except ValueError:
 				break # EOF
-			start = file.tell()
 			CID_LENGTH = 36  # XXX: this is a questionable assumption!!!
-			cid = CID(file.read(CID_LENGTH))
-			if not cid.is_cidv1_dag_cbor_sha256_32(): # I think this is enough to verify the assumption
+			cid = buf[start:start + CID_LENGTH] # raw CID bytes (no need to construct a CID object just to check them)
+			# equivalent to CID.is_cidv1_dag_cbor_sha256_32(), which I think is enough to verify the assumption
+			if len(cid) != CID_LENGTH or not cid.startswith(CID.CIDV1_DAG_CBOR_SHA256_32_PFX):
 				raise ValueError("unsupported CID type")
-			self.block_offsets[bytes(cid)] = (start + CID_LENGTH, length - CID_LENGTH)
-			file.seek(start + length)
+			self.block_offsets[cid] = (start + CID_LENGTH, length - CID_LENGTH)
+			offset = start + length
 	
+	def close(self) -> None:
+		if isinstance(self.buf, mmap.mmap):
+			self.buf.close()
+
+	def __enter__(self) -> "ReadOnlyCARBlockStore":
+		return self
+
+	def __exit__(self, *exc_info) -> None:
+		self.close()
+
 	def put_block(self, key: bytes, value: bytes) -> None:
 		raise NotImplementedError("ReadOnlyCARBlockStore does not support put()")
 	
 	def get_block(self, key: bytes) -> bytes:
 		offset, length = self.block_offsets[key]
-		self.file.seek(offset)
-		value = self.file.read(length)
+		value = self.buf[offset:offset + length]
 		if len(value) != length:
 			raise EOFError()
-		if self.validate_hashes:
-			if key[:4] != CID.CIDV1_DAG_CBOR_SHA256_32_PFX:
-				raise ValueError("unsupported CID type")
-			digest = hashlib.sha256(value).digest()
-			if digest != key[4:]:
-				raise ValueError("bad CID hash!")
+		if self.validate_hashes and key not in self.verified:
+			self._verify_block(key, value)
+			self.verified.add(key)
 		return value
+
+	def contains_block(self, key: bytes) -> bool:
+		return key in self.block_offsets
+
+	@staticmethod
+	def _verify_block(key: bytes, value: Union[bytes, memoryview]) -> None:
+		if not key.startswith(CID.CIDV1_DAG_CBOR_SHA256_32_PFX):
+			raise ValueError("unsupported CID type")
+		digest = hashlib.sha256(value).digest()
+		if digest != key[4:]:
+			raise ValueError("bad CID hash!")
+
+	def verify_all(self, max_workers: Optional[int]=None) -> None:
+		"""
+		Check the hashes of every block in the CAR up-front, raising ValueError
+		if any of them are bad. Blocks verified here won't get re-hashed by get_block().
+
+		The work is split across a thread pool - hashlib releases the GIL while
+		hashing larger inputs, so this can make use of multiple cores.
+		"""
+		keys = list(self.block_offsets)
+
+		def verify_chunk(chunk: List[bytes]) -> None:
+			for key in chunk:
+				offset, length = self.block_offsets[key]
+				with view[offset:offset + length] as value:
+					if len(value) != length:
+						raise EOFError()
+					self._verify_block(key, value)
+
+		# one chunk per worker, to keep the per-task overhead down (most blocks are tiny)
+		num_workers = max_workers or os.cpu_count() or 1
+		chunk_size = -(-len(keys) // num_workers) or 1
+		# the view lets us hash without copying
+		# (NB: views get released explicitly, since close() can't unmap the buffer while they're still around)
+		with memoryview(self.buf) as view, ThreadPoolExecutor(num_workers) as pool:
+			# NB: list() makes sure any exceptions get propagated
+			list(pool.map(verify_chunk, [keys[i:i + chunk_size] for i in range(0, len(keys), chunk_size)]))
+		self.verified.update(keys)
 	
 	def del_block(self, key: bytes) -> None:
 		raise NotImplementedError("ReadOnlyCARBlockStore does not support delete()")
@@ -2,7 +2,7 @@ import sys
 import os
 import base64
 import json
-from typing import Tuple, BinaryIO
+from typing import Tuple
 
 from cbrrr import encode_dag_cbor, decode_dag_cbor, CID
 
@@ -13,6 +13,9 @@ from .mst.node_walker import NodeWalker
 from .mst.diff import mst_diff, record_diff
 
 
+PRINT_BATCH_SIZE = 1024 # lines
+COMPACT_WRITE_BUFFER_SIZE = 1024 * 1024 # bytes
+
 def prettify_record(record) -> str:
 	return json.dumps(record, indent="  ")
 
@@ -41,12 +44,18 @@ def print_info(car_path: str) -> None:
 
 def print_all_records(car_path: str, to_json: bool) -> None:
 	bs, commit = open_car(car_path)
+	write = sys.stdout.write
+	lines = [] # batch up output, print() per line is slow for large repos
 	for k, v in NodeWalker(NodeStore(bs), commit["data"]).iter_kv():
 		if to_json:
 			record = decode_dag_cbor(bs.get_block(bytes(v)), atjson_mode=True)
-			print(f"{json.dumps(k)} -> {prettify_record(record)}")
+			lines.append(f"{json.dumps(k)} -> {prettify_record(record)}\n")
 		else:
-			print(f"{json.dumps(k)} -> {v.encode('base32')}")
+			lines.append(f"{json.dumps(k)} -> {v.encode('base32')}\n")
+		if len(lines) >= PRINT_BATCH_SIZE:
+			write("".join(lines))
+			lines.clear()
+	write("".join(lines))
 
 def list_all(car_path: str):
 	print_all_records(car_path, to_json=False)
@@ -64,30 +73,40 @@ def dump_record(car_path: str, key: str):
 	record = decode_dag_cbor(bs.get_block(bytes(val)), atjson_mode=True)
 	print(prettify_record(record))
 
-def write_block(file: BinaryIO, data: bytes) -> None:
-	file.write(encode_varint(len(data)))
-	file.write(data)
-
 def compact(car_in: str, car_out: str):
 	bs, commit = open_car(car_in)
 	with open(car_out, "wb") as carfile_out:
+		# there are lots of small blocks, so batch them up into bigger writes
+		outbuf = bytearray()
+		def buffered_write_block(cid_bytes: bytes, data: bytes) -> None:
+			outbuf.extend(encode_varint(len(cid_bytes) + len(data)))
+			outbuf.extend(cid_bytes)
+			outbuf.extend(data)
+			if len(outbuf) >= COMPACT_WRITE_BUFFER_SIZE:
+				carfile_out.write(outbuf)
+				outbuf.clear()
+
 		new_header = encode_dag_cbor({
 			"version": 1,
 			"roots": [bs.car_root]
 		})
-		write_block(carfile_out, new_header)
-		write_block(carfile_out, bytes(bs.car_root) + encode_dag_cbor(commit))
+		buffered_write_block(b"", new_header)
+		buffered_write_block(bytes(bs.car_root), encode_dag_cbor(commit))
 		dedup = {bs.car_root}
 
 		for node in NodeWalker(NodeStore(bs), commit["data"]).iter_nodes():
-			if node.cid not in dedup:
-				write_block(carfile_out, bytes(node.cid) + node.serialised)
-				dedup.add(node.cid)
+			node_cid = node.cid
+			if node_cid not in dedup:
+				buffered_write_block(bytes(node_cid), node.serialised)
+				dedup.add(node_cid)
 			for v in node.vals:
 				if v not in dedup:
-					write_block(carfile_out, bytes(v) + bs.get_block(bytes(v)))
+					v_bytes = bytes(v)
+					buffered_write_block(v_bytes, bs.get_block(v_bytes))
 					dedup.add(v)
 
+		carfile_out.write(outbuf)
+
 def _delta_str(a: str, b: str):
 	if a == b:
 		return f"{a} == {b}"
@@ -1,4 +1,4 @@
-from typing import Tuple, Set, Dict, Iterable, Optional
+from typing import Tuple, Set, Dict, Iterable, Optional, List
 from enum import Enum
 from dataclasses import dataclass
 import json
@@ -31,32 +31,37 @@ def record_diff(ns: NodeStore, created: set[CID], deleted: set[CID]) -> Iterable
 	Given two sets of MST nodes (for example, the result of :meth:`mst_diff`), this
 	returns an iterator of record changes.
 	"""
-	created_kv: Dict[str, CID] = dict(sum((list(zip(node.keys, node.vals)) for node in map(ns.get_node, created)), []))
-	deleted_kv: Dict[str, CID] = dict(sum((list(zip(node.keys, node.vals)) for node in map(ns.get_node, deleted)), []))
-	for created_key in created_kv.keys() - deleted_kv.keys():
-		yield RecordDelta(
-			delta_type=DeltaType.CREATED,
-			path=created_key,
-			prior_value=None,
-			later_value=created_kv[created_key]
-		)
-	for updated_key in created_kv.keys() & deleted_kv.keys():
-		v1 = deleted_kv[updated_key]
-		v2 = created_kv[updated_key]
-		if v1 != v2:
+	created_kv: Dict[str, CID] = {}
+	for node in ns.get_nodes(created): # batched, to save on BlockStore round-trips
+		created_kv.update(zip(node.keys, node.vals))
+	deleted_kv: Dict[str, CID] = {}
+	for node in ns.get_nodes(deleted):
+		deleted_kv.update(zip(node.keys, node.vals))
+	# classify each key with a single dict lookup, rather than doing set arithmetic on the key views
+	for key, later_value in created_kv.items():
+		prior_value = deleted_kv.get(key)
+		if prior_value is None:
+			yield RecordDelta(
+				delta_type=DeltaType.CREATED,
+				path=key,
+				prior_value=None,
+				later_value=later_value
+			)
+		elif prior_value != later_value:
 			yield RecordDelta(
 				delta_type=DeltaType.UPDATED,
-				path=updated_key,
-				prior_value=v1,
-				later_value=v2
+				path=key,
+				prior_value=prior_value,
+				later_value=later_value
+			)
+	for key, prior_value in deleted_kv.items():
+		if key not in created_kv:
+			yield RecordDelta(
+				delta_type=DeltaType.DELETED,
+				path=key,
+				prior_value=prior_value,
+				later_value=None
 			)
-	for deleted_key in deleted_kv.keys() - created_kv.keys():
-		yield RecordDelta(
-			delta_type=DeltaType.DELETED,
-			path=deleted_key,
-			prior_value=deleted_kv[deleted_key],
-			later_value=None
-		)
 
 def very_slow_mst_diff(ns: NodeStore, root_a: CID, root_b: CID):
 	"""
@@ -71,20 +76,24 @@ def very_slow_mst_diff(ns: NodeStore, root_a: CID, root_b: CID):
 
 EMPTY_NODE_CID = MSTNode.empty_root().cid
 
+# subtrees of this height or lower get diffed by direct set comparison (see _mst_diff_recursive)
+SMALL_SUBTREE_HEIGHT = 1
+
 def mst_diff(ns: NodeStore, root_a: CID, root_b: CID) -> Tuple[Set[CID], Set[CID]]: # created, deleted
 	"""
 	XXX: This implementation is not yet ready for prime-time!
 
 	Given two MST root node CIDs, efficiently compute the difference between the two trees. The result is two sets, holding the created and deleted MST nodes respectively (referenced by CIDs).
 	"""
-	created = set() # MST nodes in b but not in a
-	deleted = set() # MST nodes in a but not in b
-	_mst_diff_recursive(created, deleted, NodeWalker(ns, root_a), NodeWalker(ns, root_b))
-	middle = created & deleted # my algorithm has occasional false-positives
+	# NB: these are keyed on the raw CID bytes, since hashing bytes is much cheaper than hashing CIDs
+	created_map: Dict[bytes, CID] = {} # MST nodes in b but not in a
+	deleted_map: Dict[bytes, CID] = {} # MST nodes in a but not in b
+	_mst_diff_recursive(created_map, deleted_map, NodeWalker(ns, root_a), NodeWalker(ns, root_b))
+	middle = created_map.keys() & deleted_map.keys() # my algorithm has occasional false-positives
 	#assert(not middle) # this fails
 	#print("middle", len(middle))
-	created -= middle
-	deleted -= middle
+	created = {cid for k, cid in created_map.items() if k not in middle}
+	deleted = {cid for k, cid in deleted_map.items() if k not in middle}
 	# special case: if one of the root nodes was empty
 	if root_a == EMPTY_NODE_CID and root_b != EMPTY_NODE_CID:
 		deleted.add(EMPTY_NODE_CID)
@@ -92,66 +101,91 @@ def mst_diff(ns: NodeStore, root_a: CID, root_b: CID) -> Tuple[Set[CID], Set[CID
 		created.add(EMPTY_NODE_CID)
 	return created, deleted
 
-def _mst_diff_recursive(created: Set[CID], deleted: Set[CID], a: NodeWalker, b: NodeWalker): # created, deleted
-	# the easiest of all cases
-	if a.frame.node == b.frame.node:
-		return # no difference
+def _mst_diff_recursive(created: Dict[bytes, CID], deleted: Dict[bytes, CID], a: NodeWalker, b: NodeWalker): # created, deleted
+	# NB: despite the name, this is no longer actually recursive - pairs of subtrees
+	# that still need diffing go on a worklist (they can be processed in any order)
+	work: List[Tuple[NodeWalker, NodeWalker]] = [(a, b)]
+	while work:
+		a, b = work.pop()
+		# the easiest of all cases
+		if a.frame.node == b.frame.node:
+			continue # no difference
 	
-	# trivial
-	if a.frame.node.is_empty():
-		#mst_deleted.add(a.frame.node.cid) # this doesn't work because it might've been a null subtree node
-		created |= set(b.iter_node_cids())
-		return
+		# trivial
+		if a.frame.node._is_empty:
+			#mst_deleted.add(a.frame.node.cid) # this doesn't work because it might've been a null subtree node
+			created.update((cid.cid_bytes, cid) for cid in b.ns.subtree_cids(b.frame.node.cid, None if b.trusted else b.height))
+			continue
 	
-	# likewise
-	if b.frame.node.is_empty():
-		#mst_created.add(b.frame.node.cid)
-		deleted |= set(a.iter_node_cids())
-		return
+		# likewise
+		if b.frame.node._is_empty:
+			#mst_created.add(b.frame.node.cid)
+			deleted.update((cid.cid_bytes, cid) for cid in a.ns.subtree_cids(a.frame.node.cid, None if a.trusted else a.height))
+			continue
 	
-	# now we're onto the hard part
-
-	"""
-	theory: most trees that get compared will have lots of shared blocks (which we can skip over, due to identical CIDs)
-	completely different trees will inevitably have to visit every node.
-
-	general idea:
-	1. if one cursor is "behind" the other, catch it up
-	2. when we're matched up, skip over identical subtrees (and recursively diff non-identical subtrees)
-
-	XXX: this seems to work nicely but I'm not sure if it's necessarily efficient for all tree layouts?
-	"""
-
-	# NB: these will end up as false-positives if one tree is a subtree of the other
-	created.add(b.frame.node.cid)
-	deleted.add(a.frame.node.cid)
-
-	while True:
-		while a.rpath != b.rpath: # we need a loop because they might "leapfrog" each other
-			# "catch up" cursor a, if it's behind
-			while a.rpath < b.rpath and not a.is_final:
-				if a.subtree: # recurse down every subtree
-					a.down()
-					deleted.add(a.frame.node.cid)
-				else:
-					a.right_or_up()
+		# for small subtrees, it's cheaper to directly compare the sets of nodes
+		# than it is to walk them (and this way, we get no false-positives)
+		if a.height <= SMALL_SUBTREE_HEIGHT:
+			a_cids = a.ns.subtree_cids(a.frame.node.cid, None if a.trusted else a.height)
+			b_cids = b.ns.subtree_cids(b.frame.node.cid, None if b.trusted else b.height)
+			created.update((cid.cid_bytes, cid) for cid in b_cids - a_cids)
+			deleted.update((cid.cid_bytes, cid) for cid in a_cids - b_cids)
+			continue
+
+		# now we're onto the hard part
+
+		"""
+		theory: most trees that get compared will have lots of shared blocks (which we can skip over, due to identical CIDs)
+		completely different trees will inevitably have to visit every node.
+
+		general idea:
+		1. if one cursor is "behind" the other, catch it up
+		2. when we're matched up, skip over identical subtrees (and recursively diff non-identical subtrees)
+
+		XXX: this seems to work nicely but I'm not sure if it's necessarily efficient for all tree layouts?
+		"""
+
+		# NB: these will end up as false-positives if one tree is a subtree of the other
+		cid = b.frame.node.cid
+		created[cid.cid_bytes] = cid
+		cid = a.frame.node.cid
+		deleted[cid.cid_bytes] = cid
+
+		# hoist the method lookups out of the hot loops
+		a_down, a_right_or_up, a_stack = a.down, a.right_or_up, a.stack
+		b_down, b_right_or_up, b_stack = b.down, b.right_or_up, b.stack
+
+		while True:
+			while a.rpath != b.rpath: # we need a loop because they might "leapfrog" each other
+				# "catch up" cursor a, if it's behind
+				b_rpath = b.rpath # b doesn't move in here
+				while a.rpath < b_rpath and not a.is_final:
+					if a.subtree: # recurse down every subtree
+						a_down()
+						cid = a_stack[-1].node.cid
+						deleted[cid.cid_bytes] = cid
+					else:
+						a_right_or_up()
 			
-			# catch up cursor b, likewise
-			while b.rpath < a.rpath and not b.is_final:
-				if b.subtree: # recurse down every subtree
-					b.down()
-					created.add(b.frame.node.cid)
-				else:
-					b.right_or_up()
-
-		# the rpaths now match, but the subrees below us might not
-		
-		_mst_diff_recursive(created, deleted, a.subtree_walker(), b.subtree_walker())
-
-		# check if we can still go right XXX: do we need to care about the case where one can, but the other can't?
-		# To consider: maybe if I just step a, b will catch up automagically
-		if a.rpath == a.stack[0].rpath and b.rpath == b.stack[0].rpath:
-			break
-
-		a.right_or_up()
-		b.right_or_up()
+				# catch up cursor b, likewise
+				a_rpath = a.rpath
+				while b.rpath < a_rpath and not b.is_final:
+					if b.subtree: # recurse down every subtree
+						b_down()
+						cid = b_stack[-1].node.cid
+						created[cid.cid_bytes] = cid
+					else:
+						b_right_or_up()
+
+			# the rpaths now match, but the subrees below us might not
+			# (if their CIDs match, we can skip them without even loading them)
+			if a.subtree != b.subtree:
+				work.append((a.subtree_walker(), b.subtree_walker()))
+
+			# check if we can still go right XXX: do we need to care about the case where one can, but the other can't?
+			# To consider: maybe if I just step a, b will catch up automagically
+			if a.rpath == a_stack[0].rpath and b.rpath == b_stack[0].rpath:
+				break
+
+			a.right_or_up()
+			b.right_or_up()
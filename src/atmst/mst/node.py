@@ -1,8 +1,6 @@
 import hashlib
-import operator
-from functools import cached_property
-from more_itertools import ilen
-from itertools import takewhile
+from bisect import bisect_left
+from functools import cached_property, lru_cache
 from dataclasses import dataclass
 
 from typing import TYPE_CHECKING, Tuple, Optional
@@ -11,6 +9,21 @@ if TYPE_CHECKING: # Self doesn't exist <3.11
 
 from cbrrr import encode_dag_cbor, decode_dag_cbor, CID
 
+# number of leading zero bits in each possible byte value
+_BYTE_LEADING_ZEROES = bytes(8 - b.bit_length() for b in range(256))
+
+def _shared_prefix_len(a: bytes, b: bytes) -> int:
+	# binary search on the prefix length, so that the actual comparisons
+	# happen in C (much faster than comparing byte-by-byte in python)
+	lo, hi = 0, min(len(a), len(b))
+	while lo < hi:
+		mid = (lo + hi + 1) // 2
+		if a[:mid] == b[:mid]:
+			lo = mid
+		else:
+			hi = mid - 1
+	return lo
+
 
 @dataclass(frozen=True) # frozen == immutable == win
 class MSTNode:
@@ -39,11 +52,29 @@ class MSTNode:
 			raise ValueError("Invalid subtree count")
 		if len(self.keys) != len(self.vals):
 			raise ValueError("Mismatched keys/vals lengths")
-		key_heights = [MSTNode.key_height(k) for k in self.keys]
-		if any(k!=key_heights[0] for k in key_heights):
+		key_heights = set(map(MSTNode.key_height, self.keys)) # (map+set keeps this loop in C)
+		if len(key_heights) > 1:
 			raise ValueError("Inconsistent key heights")
 
+		# these get checked a lot during tree wrangling, so compute them up-front
+		# (we're frozen, hence the object.__setattr__)
+		object.__setattr__(self, "_is_empty", self.subtrees == (None,))
+
+		# we already had to compute the key heights, so we may as well remember ours
+		if key_heights: # if there are keys at this level, they tell us directly
+			maybe_height, = key_heights
+		elif self.subtrees[0] is None: # we're an empty tree
+			maybe_height = 0
+		else:
+			# this should only happen for non-root nodes with no keys (aka an empty intermediate node)
+			maybe_height = None
+			# NOTE: a Node class cannot see what's below it. You'll need to track
+			# state externally (like NodeWrangler does) if you want to find out
+		object.__setattr__(self, "maybe_height", maybe_height)
+
+	# the empty node is immutable, so everyone may as well share one instance (and its cached CID)
 	@classmethod
+	@lru_cache(maxsize=None)
 	def empty_root(cls) -> "Self":
 		return cls(
 			subtrees=(None,),
@@ -52,10 +83,17 @@ class MSTNode:
 		)
 
 	# this should maybe not be implemented here?
+	# NB: this gets called for every key of every node we construct, so it's worth memoizing
 	@staticmethod
+	@lru_cache(maxsize=0x10000)
 	def key_height(key: str) -> int:
-		digest = int.from_bytes(hashlib.sha256(key.encode()).digest(), "big")
-		leading_zeroes = 256 - digest.bit_length()
+		# count leading zero bits a byte at a time, rather than converting
+		# the whole digest to an int (the first byte is nonzero 255/256 of the time)
+		leading_zeroes = 0
+		for byte in hashlib.sha256(key.encode()).digest():
+			if byte:
+				return (leading_zeroes + _BYTE_LEADING_ZEROES[byte]) // 2
+			leading_zeroes += 8
 		return leading_zeroes // 2
 
 	# since we're immutable, this can be cached
@@ -70,7 +108,7 @@ class MSTNode:
 		prev_key = b""
 		for subtree, key_str, value in zip(self.subtrees[1:], self.keys, self.vals):
 			key_bytes = key_str.encode()
-			shared_prefix_len = ilen(takewhile(bool, map(operator.eq, prev_key, key_bytes))) # I love functional programming
+			shared_prefix_len = _shared_prefix_len(prev_key, key_bytes)
 			e.append({
 				"k": key_bytes[shared_prefix_len:],
 				"p": shared_prefix_len,
@@ -116,31 +154,16 @@ class MSTNode:
 		)
 
 	def is_empty(self) -> bool:
-		return self.subtrees == (None,)
+		return self._is_empty
 
 	def _to_optional(self) -> Optional[CID]:
 		"""
 		returns None if the node is empty
 		"""
-		if self.is_empty():
-			return None
-		return self.cid
-
-
-	@cached_property
-	def maybe_height(self) -> Optional[int]:
-		# if there are keys at this level, query one directly
-		if self.keys:
-			return self.key_height(self.keys[0])
+		return None if self._is_empty else self.cid
 
-		# we're an empty tree
-		if self.subtrees[0] is None:
-			return 0
 
-		# this should only happen for non-root nodes with no keys (aka an empty intermediate node)
-		return None
-		# NOTE: a Node class cannot see what's below it. You'll need to track
-		# state externally (like NodeWrangler does) if you want to find out
+	# NB: maybe_height is set in __post_init__
 
 	def definitely_height(self) -> int:
 		if self.maybe_height is None:
@@ -152,23 +175,20 @@ class MSTNode:
 		find the index of the first key greater than or equal to the specified key
 		if all keys are smaller, it returns len(keys)
 		"""
-		i = 0 # this loop could be a binary search but not worth it for small fanouts
-		while i < len(self.keys) and key > self.keys[i]:
-			i += 1
-		return i
+		return bisect_left(self.keys, key) # keys are always sorted
 
 
 """
 if __name__ == "__main__":
 	from .blockstore import MemoryBlockStore, OverlayBlockStore
-	from .blockstore.car_reader import ReadOnlyCARBlockStore
+	from .blockstore.car_file import ReadOnlyCARBlockStore
 
 	if 0:
 		import sys
 		sys.setrecursionlimit(999999999)
 		f = open("/home/david/programming/python/bskyclient/retr0id.car", "rb")
 		bs = OverlayBlockStore(MemoryBlockStore(), ReadOnlyCARBlockStore(f))
-		commit_obj = dag_cbor.decode(bs.get_block(bytes(bs.lower.car_roots[0])))
+		commit_obj = decode_dag_cbor(bs.get_block(bytes(bs.lower.car_root)))
 		mst_root: CID = commit_obj["data"]
 		ns = NodeStore(bs)
 		wrangler = NodeWrangler(ns)
@@ -1,4 +1,4 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, FrozenSet, Iterable, List, Tuple
 from functools import lru_cache
 
 from cbrrr import CID
@@ -8,44 +8,132 @@ from ..blockstore import BlockStore
 from ..util import indent
 from .node import MSTNode
 
+# the empty node never changes, so there's no point re-creating (and re-hashing) it every time
+_EMPTY_NODE = MSTNode.empty_root()
+
 class NodeStore:
 	"""
 	NodeStore wraps a BlockStore to provide a more ergonomic interface
 	for loading and storing MSTNodes
+
+	Loaded nodes are cached in two tiers: nodes of height >= upper_min_height
+	go in upper_cache, everything else goes in cache. The upper levels of a
+	tree get revisited on almost every operation, and this way they don't get
+	evicted by churn in the (much more numerous) lower levels.
 	"""
 	bs: BlockStore
 	cache: Dict[Optional[CID], MSTNode]
+	upper_cache: Dict[CID, MSTNode]
+	subtree_cids_cache: Dict[Tuple[CID, Optional[int]], FrozenSet[CID]]
 
-	def __init__(self, bs: BlockStore) -> None:
+	def __init__(self,
+		bs: BlockStore,
+		cache_size: int=1024,
+		upper_cache_size: int=1024,
+		upper_min_height: int=3
+	) -> None:
 		self.bs = bs
-		self.cache = LRU(1024)
+		self.cache = LRU(cache_size)
+		self.upper_cache = LRU(upper_cache_size)
+		self.upper_min_height = upper_min_height
+		self.subtree_cids_cache = LRU(1024)
+		self._stored_empty = False
 	
 	def get_node(self, cid: Optional[CID]) -> MSTNode:
-		if cached := self.cache.get(cid): # look in our LRU cache first
-			return cached
 		"""
 		if cid is None, returns an empty MST node
 		"""
 		if cid is None:
-			return self.stored_node(MSTNode.empty_root())
+			# we only need to write the empty node to the blockstore once
+			if not self._stored_empty:
+				self.stored_node(_EMPTY_NODE)
+				self._stored_empty = True
+			return _EMPTY_NODE
+
+		cached = self.cache.get(cid) # look in our LRU caches first
+		if cached is None:
+			cached = self.upper_cache.get(cid)
+		if cached is not None:
+			return cached
 		
-		node_bytes = self.bs.get_block(bytes(cid))
+		return self._load_node(cid, self.bs.get_block(bytes(cid)))
+
+	def get_nodes(self, cids: Iterable[CID]) -> List[MSTNode]:
+		"""
+		like get_node() (but without the None case), for lots of CIDs at once.
+		Any nodes that aren't already cached are fetched from the
+		BlockStore with a single get_blocks() call.
+		"""
+		cids = list(cids)
+		# NB: collect results here rather than relying on the LRU, since a big batch could evict its own entries
+		nodes: Dict[CID, MSTNode] = {}
+		uncached: List[CID] = []
+		for cid in cids:
+			cached = self.cache.get(cid)
+			if cached is None:
+				cached = self.upper_cache.get(cid)
+			if cached is None:
+				uncached.append(cid)
+			else:
+				nodes[cid] = cached
+		if uncached:
+			blocks = self.bs.get_blocks(bytes(cid) for cid in uncached)
+			for cid in uncached:
+				nodes[cid] = self._load_node(cid, blocks[bytes(cid)])
+		return [nodes[cid] for cid in cids]
+
+	def _load_node(self, cid: CID, node_bytes: bytes) -> MSTNode:
 		node = MSTNode.deserialise(node_bytes)
 
 		# prime the cached_properties since we already know their values
 		object.__setattr__(node, "serialised", node_bytes)
 		object.__setattr__(node, "cid", cid)
 
-		# prime the node cache
-		self.cache[cid] = node
+		self._cache_node(cid, node) # prime the node cache
 
 		return node
+
+	def _cache_node(self, cid: CID, node: MSTNode) -> None:
+		height = node.maybe_height
+		if height is not None and height >= self.upper_min_height:
+			self.upper_cache[cid] = node
+		else:
+			self.cache[cid] = node
 	
 	def stored_node(self, node: MSTNode) -> MSTNode:
-		self.cache[node.cid] = node # also put it in the LRU cache
-		self.bs.put_block(bytes(node.cid), node.serialised)
+		cid = node.cid
+		self._cache_node(cid, node) # also put it in the LRU cache
+		self.bs.put_block(bytes(cid), node.serialised)
 		return node # this is convenient
 
+	def subtree_cids(self, cid: CID, height: Optional[int]=None) -> FrozenSet[CID]:
+		"""
+		returns the CIDs of every node in the tree rooted at cid (including cid itself)
+
+		This is a pure function of the root CID (and height), so results are cached - that
+		makes repeated enumeration of the same subtrees (e.g. during diffing) cheap.
+
+		If height is passed, it's the expected height of the node at cid, and the heights
+		of it and all its subtrees get checked for consistency (like an untrusted
+		NodeWalker would), raising ValueError if they don't match.
+		"""
+		cache_key = (cid, height)
+		cached = self.subtree_cids_cache.get(cache_key)
+		if cached is not None:
+			return cached
+		node = self.get_node(cid)
+		# the "None" case occurs for empty intermediate nodes
+		if height is not None and node.maybe_height is not None and node.maybe_height != height:
+			raise ValueError(f"inconsistent subtree height ({node.maybe_height}, expected {height})")
+		subtree_height = None if height is None else height - 1
+		cids = {cid}
+		for subtree in node.subtrees:
+			if subtree is not None:
+				cids.update(self.subtree_cids(subtree, subtree_height))
+		result = frozenset(cids)
+		self.subtree_cids_cache[cache_key] = result
+		return result
+
 	# MST pretty-printing
 	# this should maybe not be implemented here
 	def pretty(self, node_cid: Optional[CID]) -> str:
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Tuple, Optional, List, Iterable
+from typing import TYPE_CHECKING, Tuple, Optional, List, Iterable, Set
 if TYPE_CHECKING: # Self doesn't exist <3.11
 	from typing import Self
 
@@ -30,6 +30,9 @@ class NodeWalker:
 
 	@dataclass
 	class StackFrame:
+		# we make a lot of these, and slots make them smaller and faster to create
+		# (NB: dataclass(slots=True) would be nicer, but it requires python 3.10+)
+		__slots__ = ("node", "lpath", "rpath", "idx")
 		node: MSTNode # could store CIDs only to save memory, in theory, but not much point
 		lpath: str
 		rpath: str
@@ -53,12 +56,14 @@ class NodeWalker:
 		self.root_height = node.maybe_height if root_height is None else root_height
 		if self.root_height is None:
 			raise ValueError("indeterminate node height - pass it in if you know it")
-		self.stack = [self.StackFrame(
+		self._root_frame = self.StackFrame(
 			node=node,
 			lpath=lpath,
 			rpath=rpath,
 			idx=0
-		)]
+		)
+		self.stack = [self._root_frame]
+		self._base_rpath = rpath # i.e. self.stack[0].rpath, which never changes
 	
 	def subtree_walker(self) -> "Self":
 		return NodeWalker(
@@ -78,51 +83,80 @@ class NodeWalker:
 	def height(self) -> int:
 		return self.root_height - (len(self.stack) - 1)
 
+	# NB: these properties get hit a *lot*, so they look up the current frame
+	# just once, rather than going via self.frame repeatedly
+
 	@property
 	def lpath(self) -> str:
-		return self.frame.lpath if self.frame.idx == 0 else self.frame.node.keys[self.frame.idx - 1]
+		frame = self.stack[-1]
+		return frame.lpath if frame.idx == 0 else frame.node.keys[frame.idx - 1]
 	
 	@property
 	def lval(self) -> Optional[CID]:
-		return None if self.frame.idx == 0 else self.frame.node.vals[self.frame.idx - 1]
+		frame = self.stack[-1]
+		return None if frame.idx == 0 else frame.node.vals[frame.idx - 1]
 
 	@property
 	def subtree(self) -> Optional[CID]:
-		return self.frame.node.subtrees[self.frame.idx]
+		frame = self.stack[-1]
+		return frame.node.subtrees[frame.idx]
 	
 	@property
 	def rpath(self) -> str:
-		return self.frame.rpath if self.frame.idx == len(self.frame.node.keys) else self.frame.node.keys[self.frame.idx]
+		frame = self.stack[-1]
+		keys = frame.node.keys
+		return frame.rpath if frame.idx == len(keys) else keys[frame.idx]
 	
 	@property
 	def rval(self) -> Optional[CID]:
-		return None if self.frame.idx == len(self.frame.node.vals) else self.frame.node.vals[self.frame.idx]
+		frame = self.stack[-1]
+		vals = frame.node.vals
+		return None if frame.idx == len(vals) else vals[frame.idx]
 
 	@property
 	def is_final(self) -> bool:
 		# is (not self.stack) really necesasry here? is that a reachable state?
-		return (not self.stack) or (self.subtree is None and self.rpath == self.stack[0].rpath)
+		stack = self.stack
+		if not stack:
+			return True
+		frame = stack[-1]
+		keys = frame.node.keys
+		if frame.node.subtrees[frame.idx] is not None:
+			return False
+		return (frame.rpath if frame.idx == len(keys) else keys[frame.idx]) == self._base_rpath
 
 	@property
 	def can_go_right(self) -> bool:
-		return (self.frame.idx + 1) < len(self.frame.node.subtrees)
+		frame = self.stack[-1]
+		return (frame.idx + 1) < len(frame.node.subtrees)
 
 	def right_or_up(self) -> None:
-		if not self.can_go_right:
+		stack = self.stack
+		frame = stack[-1]
+		# we need to loop, to skip over empty intermediates on the way back up
+		while frame.idx + 1 >= len(frame.node.subtrees): # i.e. not self.can_go_right
 			# we reached the end of this node, go up a level
-			self.stack.pop() # TODO: check before pop - make empty-stack an unreachable state
-			if not self.stack:
+			stack.pop() # TODO: check before pop - make empty-stack an unreachable state
+			if not stack:
 				raise StopIteration # you probably want to check .final instead of hitting this
-			return self.right_or_up() # we need to recurse, to skip over empty intermediates on the way back up
-		self.frame.idx += 1
+			frame = stack[-1]
+		frame.idx += 1
+
+	def rewind(self) -> None:
+		"""
+		go back to the start of the root node (as if we'd just been constructed)
+		"""
+		self._root_frame.idx = 0
+		self.stack[:] = [self._root_frame] # (the stack might've been emptied by right_or_up)
 
 	def right(self) -> None:
 		if not self.can_go_right:
 			raise ValueError("cursor is already at rightmost position in node")
-		self.frame.idx += 1
+		self.stack[-1].idx += 1
 
 	def down(self) -> None:
-		subtree = self.frame.node.subtrees[self.frame.idx]
+		frame = self.stack[-1]
+		subtree = frame.node.subtrees[frame.idx]
 		if subtree is None:
 			raise ValueError("oi, you can't recurse here mate (subtree is None)")
 
@@ -133,10 +167,11 @@ class NodeWalker:
 			if subtree_node.maybe_height is not None and subtree_node.maybe_height != self.height - 1:
 				raise ValueError(f"inconsistent subtree height ({subtree_node.maybe_height}, expected {self.height - 1})")
 
+		idx, keys = frame.idx, frame.node.keys
 		self.stack.append(self.StackFrame(
 			node=subtree_node,
-			lpath=self.lpath,
-			rpath=self.rpath,
+			lpath=frame.lpath if idx == 0 else keys[idx - 1], # i.e. self.lpath
+			rpath=frame.rpath if idx == len(keys) else keys[idx], # i.e. self.rpath
 			idx=0
 		))
 	
@@ -171,6 +206,9 @@ class NodeWalker:
 	# start inclusive
 	def iter_kv_range(self, start: str, end: str, end_inclusive: bool=False) -> Iterable[Tuple[str, CID]]:
 		while True:
+			# jump straight to the right place within this node (rather than stepping one key at a time)
+			frame = self.stack[-1]
+			frame.idx = max(frame.idx, frame.node.gte_index(start))
 			while self.rpath < start:
 				self.right_or_up()
 			if not self.subtree:
@@ -184,17 +222,22 @@ class NodeWalker:
 
 	# TODO: we need to make this early-exit so that it can work with concise deletion proofs, maybe
 	# (early exit based on key height - might need significant rewrite)
-	def find_rpath(self, rpath: str) -> Optional[CID]:
+	# if collect_cids is passed, the CIDs of the nodes we visit get added to it
+	# (for a fresh walker, that's exactly the set of nodes needed for an inclusion/exclusion proof)
+	def find_rpath(self, rpath: str, collect_cids: Optional[Set[CID]]=None) -> Optional[CID]:
 		rpath_height = MSTNode.key_height(rpath)
 		while True:
+			if collect_cids is not None:
+				collect_cids.add(self.stack[-1].node.cid)
 			# if the rpath we're looking for is higher than the current cursor,
 			# we're never going to find it (i.e. we early-exit)
 			if rpath_height > self.height:
 				return None
-			while self.rpath < rpath: # either look for the rpath, or the right point to go down
-				if not self.can_go_right:
-					return None
-				self.right()
+			# either look for the rpath, or the right point to go down (bisecting, rather than stepping along)
+			frame = self.stack[-1]
+			frame.idx = max(frame.idx, frame.node.gte_index(rpath))
+			if self.rpath < rpath:
+				return None # it's beyond the right edge of this node
 			if self.rpath == rpath:
 				return self.rval # found it!
 			if not self.subtree:
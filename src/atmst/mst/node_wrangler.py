@@ -1,4 +1,4 @@
-from typing import Tuple, Optional, Any
+from typing import Tuple, Optional, Any, List
 
 from cbrrr import CID
 
@@ -6,11 +6,18 @@ from .node import MSTNode
 from .node_store import NodeStore
 
 # tuple helpers
+# NB: going via a list is faster than slicing+concatenating for replace and insert
+# (for remove, it's a wash, so we keep the simpler version)
+
 def _tuple_replace_at(original: tuple, i: int, value: Any) -> tuple:
-	return original[:i] + (value,) + original[i + 1:]
+	res = list(original)
+	res[i] = value
+	return tuple(res)
 
 def _tuple_insert_at(original: tuple, i: int, value: Any) -> tuple:
-	return original[:i] + (value,) + original[i:]
+	res = list(original)
+	res.insert(i, value)
+	return tuple(res)
 
 def _tuple_remove_at(original: tuple, i: int) -> tuple:
 	return original[:i] + original[i + 1:]
@@ -35,7 +42,7 @@ class NodeWrangler:
 
 	def put_record(self, root_cid: CID, key: str, val: CID) -> CID:
 		root = self.ns.get_node(root_cid)
-		if root.is_empty(): # special case for empty tree
+		if root._is_empty: # special case for empty tree
 			return self._put_here(root, key, val).cid
 		return self._put_recursive(root, key, val, MSTNode.key_height(key), root.definitely_height()).cid
 
@@ -76,27 +83,28 @@ class NodeWrangler:
 	
 	def _put_recursive(self, node: MSTNode, key: str, val: CID, key_height: int, tree_height: int) -> MSTNode:
 		if key_height > tree_height: # we need to grow the tree
-			return self.ns.stored_node(self._put_recursive(
+			# (the recursive call already returns a stored node, no need to store it again)
+			return self._put_recursive(
 				self.ns.stored_node(MSTNode(
 					keys=(),
 					vals=(),
 					subtrees=(node.cid,)
 				)),
 				key, val, key_height, tree_height + 1
-			))
+			)
 		
 		if key_height < tree_height: # we need to look below
 			i = node.gte_index(key)
+			subtree_cid = self._put_recursive(
+				self.ns.get_node(node.subtrees[i]),
+				key, val, key_height, tree_height - 1
+			).cid
+			if subtree_cid == node.subtrees[i]:
+				return node # the subtree didn't change, so neither do we
 			return self.ns.stored_node(MSTNode(
 				keys=node.keys,
 				vals=node.vals,
-				subtrees=_tuple_replace_at(
-					node.subtrees, i,
-					self._put_recursive(
-						self.ns.get_node(node.subtrees[i]),
-						key, val, key_height, tree_height - 1
-					).cid
-				)
+				subtrees=_tuple_replace_at(node.subtrees, i, subtree_cid)
 			))
 		
 		# we can insert here
@@ -104,50 +112,68 @@ class NodeWrangler:
 		return self._put_here(node, key, val)
 	
 	def _split_on_key(self, node_cid: Optional[CID], key: str) -> Tuple[Optional[CID], Optional[CID]]:
-		if node_cid is None:
-			return None, None
-		node = self.ns.get_node(node_cid)
-		i = node.gte_index(key)
-		lsub, rsub = self._split_on_key(node.subtrees[i], key)
-		return self.ns.stored_node(MSTNode(
-			keys=node.keys[:i],
-			vals=node.vals[:i],
-			subtrees=node.subtrees[:i] + (lsub,)
-		))._to_optional(), self.ns.stored_node(MSTNode(
-			keys=node.keys[i:],
-			vals=node.vals[i:],
-			subtrees=(rsub,) + node.subtrees[i + 1:],
-		))._to_optional()
+		# walk down to the bottom of the tree, remembering the path we took
+		path: List[Tuple[MSTNode, int]] = []
+		while node_cid is not None:
+			node = self.ns.get_node(node_cid)
+			i = node.gte_index(key)
+			path.append((node, i))
+			node_cid = node.subtrees[i]
+
+		# then build the left and right halves back up from the bottom
+		lsub, rsub = None, None
+		for node, i in reversed(path):
+			lsub, rsub = self.ns.stored_node(MSTNode(
+				keys=node.keys[:i],
+				vals=node.vals[:i],
+				subtrees=node.subtrees[:i] + (lsub,)
+			))._to_optional(), self.ns.stored_node(MSTNode(
+				keys=node.keys[i:],
+				vals=node.vals[i:],
+				subtrees=(rsub,) + node.subtrees[i + 1:],
+			))._to_optional()
+		return lsub, rsub
 
 	def _squash_top(self, node_cid: Optional[CID]) -> Optional[CID]:
 		"""
 		strip empty nodes from the top of the tree
 		"""
-		node = self.ns.get_node(node_cid)
-		if node.keys:
-			return node_cid
-		if node.subtrees[0] is None:
-			return node_cid
-		return self._squash_top(node.subtrees[0])
-
+		while True:
+			node = self.ns.get_node(node_cid)
+			if node.keys:
+				return node_cid
+			if node.subtrees[0] is None:
+				return node_cid
+			node_cid = node.subtrees[0]
+
+	# NB: not actually recursive any more (we walk down and then rebuild the path on the way back up)
 	def _delete_recursive(self, node: MSTNode, key: str, key_height: int, tree_height: int) -> Optional[CID]:
-		if key_height > tree_height: # the key cannot possibly be in this tree, no change needed
-			return node._to_optional()
-		
-		i = node.gte_index(key)
-		if key_height < tree_height: # the key must be deleted from a subtree
+		path: List[Tuple[MSTNode, int]] = []
+		while key_height < tree_height: # the key must be deleted from a subtree
+			i = node.gte_index(key)
 			if node.subtrees[i] is None:
-				return node._to_optional() # the key cannot be in this subtree, no change needed
-			return self.ns.stored_node(MSTNode(
+				break # the key cannot be in this subtree, no change needed
+			path.append((node, i))
+			node = self.ns.get_node(node.subtrees[i])
+			tree_height -= 1
+
+		if key_height == tree_height:
+			new_cid = self._delete_here(node, key)
+		else: # the key cannot possibly be in this tree, no change needed
+			new_cid = node._to_optional()
+
+		for node, i in reversed(path):
+			if new_cid == node.subtrees[i]:
+				# the subtree didn't change, so nothing above it will either
+				return path[0][0]._to_optional()
+			new_cid = self.ns.stored_node(MSTNode(
 				keys=node.keys,
 				vals=node.vals,
-				subtrees=_tuple_replace_at(
-					node.subtrees,
-					i,
-					self._delete_recursive(self.ns.get_node(node.subtrees[i]), key, key_height, tree_height - 1)
-				)
+				subtrees=_tuple_replace_at(node.subtrees, i, new_cid)
 			))._to_optional()
-		
+		return new_cid
+
+	def _delete_here(self, node: MSTNode, key: str) -> Optional[CID]:
 		i = node.gte_index(key)
 		if i == len(node.keys) or node.keys[i] != key:
 			return node._to_optional() # key already not present
@@ -163,19 +189,21 @@ class NodeWrangler:
 		))._to_optional()
 	
 	def _merge(self, left_cid: Optional[CID], right_cid: Optional[CID]) -> Optional[CID]:
-		if left_cid is None:
-			return right_cid # includes the case where left == right == None
-		if right_cid is None:
-			return left_cid
-		left = self.ns.get_node(left_cid)
-		right = self.ns.get_node(right_cid)
-		return self.ns.stored_node(MSTNode(
-			keys=left.keys + right.keys,
-			vals=left.vals + right.vals,
-			subtrees=left.subtrees[:-1] + (
-				self._merge(
-					left.subtrees[-1],
-					right.subtrees[0]
-				),
-			 ) + right.subtrees[1:]
-		))._to_optional()
+		# walk down the "seam" between the two trees until one side runs out
+		path: List[Tuple[MSTNode, MSTNode]] = []
+		while left_cid is not None and right_cid is not None:
+			left = self.ns.get_node(left_cid)
+			right = self.ns.get_node(right_cid)
+			path.append((left, right))
+			left_cid, right_cid = left.subtrees[-1], right.subtrees[0]
+
+		# whichever side is left over becomes the bottom of the seam
+		merged = right_cid if left_cid is None else left_cid # includes the case where left == right == None
+
+		for left, right in reversed(path):
+			merged = self.ns.stored_node(MSTNode(
+				keys=left.keys + right.keys,
+				vals=left.vals + right.vals,
+				subtrees=left.subtrees[:-1] + (merged,) + right.subtrees[1:]
+			))._to_optional()
+		return merged
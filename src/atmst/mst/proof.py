@@ -1,4 +1,4 @@
-from typing import Set, Tuple, Optional
+from typing import Set, Tuple, Optional, Iterable
 
 from cbrrr import CID
 
@@ -16,9 +16,8 @@ class ProofError(ValueError):
 
 # works for both inclusion and exclusion proofs
 def find_rpath_and_build_proof(ns: NodeStore, root_cid: CID, rpath: str) -> Tuple[Optional[CID], Set[CID]]:
-	walker = NodeWalker(ns, root_cid)
-	value = walker.find_rpath(rpath) # returns None if not found
-	proof = {frame.node.cid for frame in walker.stack}
+	proof: Set[CID] = set()
+	value = NodeWalker(ns, root_cid).find_rpath(rpath, collect_cids=proof) # returns None if not found
 	return value, proof
 
 def build_exclusion_proof(ns: NodeStore, root_cid: CID, rpath: str) -> Set[CID]:
@@ -34,17 +33,36 @@ def build_inclusion_proof(ns: NodeStore, root_cid: CID, rpath: str) -> Set[CID]:
 	return proof
 
 def verify_inclusion(ns: NodeStore, root_cid: CID, rpath: str) -> None:
+	verify_inclusion_batch(ns, root_cid, (rpath,))
+
+def verify_exclusion(ns: NodeStore, root_cid: CID, rpath: str) -> None:
+	verify_exclusion_batch(ns, root_cid, (rpath,))
+
+def _find_rpaths(ns: NodeStore, root_cid: CID, rpaths: Iterable[str]) -> Iterable[Tuple[str, Optional[CID]]]:
+	# one walker, rewound to the root between lookups, so the root only gets loaded once
 	walker = NodeWalker(ns, root_cid)
+	for rpath in rpaths:
+		walker.rewind()
+		yield rpath, walker.find_rpath(rpath)
+
+def verify_inclusion_batch(ns: NodeStore, root_cid: CID, rpaths: Iterable[str]) -> None:
+	"""
+	like verify_inclusion(), but for lots of rpaths against the same root
+	"""
 	try:
-		if walker.find_rpath(rpath) is None:
-			raise InvalidProof("rpath not present in MST")
+		for rpath, value in _find_rpaths(ns, root_cid, rpaths):
+			if value is None:
+				raise InvalidProof(f"rpath not present in MST ({rpath!r})")
 	except KeyError:
 		raise InvalidProof("missing MST blocks")
 
-def verify_exclusion(ns: NodeStore, root_cid: CID, rpath: str) -> None:
-	walker = NodeWalker(ns, root_cid)
+def verify_exclusion_batch(ns: NodeStore, root_cid: CID, rpaths: Iterable[str]) -> None:
+	"""
+	like verify_exclusion(), but for lots of rpaths against the same root
+	"""
 	try:
-		if walker.find_rpath(rpath) is not None:
-			raise InvalidProof("rpath *is* present in MST")
+		for rpath, value in _find_rpaths(ns, root_cid, rpaths):
+			if value is not None:
+				raise InvalidProof(f"rpath *is* present in MST ({rpath!r})")
 	except KeyError:
 		raise InvalidProof("missing MST blocks")
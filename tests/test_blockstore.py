@@ -0,0 +1,89 @@
+import unittest
+import sqlite3
+
+from atmst.blockstore import MemoryBlockStore, SqliteBlockStore, OverlayBlockStore
+
+class SqliteBlockStoreTestCase(unittest.TestCase):
+	def setUp(self):
+		self.con = sqlite3.connect(":memory:")
+		self.bs = SqliteBlockStore(self.con)
+
+	def tearDown(self):
+		self.con.close()
+
+	def test_del_via_other_instance(self):
+		self.bs.put_block(b"hello", b"world")
+		self.assertEqual(self.bs.get_block(b"hello"), b"world")
+		SqliteBlockStore(self.con).del_block(b"hello")
+		self.assertRaises(KeyError, self.bs.get_block, b"hello")
+		self.assertFalse(self.bs.contains_block(b"hello"))
+
+	def test_rollback(self):
+		self.bs.put_block(b"hello", b"world")
+		self.assertEqual(self.bs.get_block(b"hello"), b"world")
+		self.con.rollback()
+		self.assertRaises(KeyError, self.bs.get_block, b"hello")
+		self.assertFalse(self.bs.contains_block(b"hello"))
+	def test_get_blocks(self):
+		blocks = {f"key{i}".encode(): f"val{i}".encode() for i in range(50)}
+		self.bs.put_blocks(blocks.items())
+		self.bs.GET_BLOCKS_CHUNK_SIZE = 7
+		queries = []
+		self.con.set_trace_callback(queries.append)
+		keys = list(blocks) + list(blocks)[:10] # with some duplicates
+		self.assertEqual(self.bs.get_blocks(keys), blocks)
+		self.assertEqual(len(queries), 8) # ceil(50/7), duplicates don't get fetched twice
+
+	def test_get_blocks_cached(self):
+		bs = SqliteBlockStore(self.con, cache_size=16)
+		blocks = {f"key{i}".encode(): f"val{i}".encode() for i in range(10)}
+		bs.put_blocks(blocks.items())
+		cached_keys = list(blocks)[:5]
+		for key in cached_keys:
+			bs.get_block(key) # prime the cache
+		# remove the cached blocks from the db behind the cache's back,
+		# so that fetching them from the db would fail
+		self.con.executemany("DELETE FROM mst_blocks WHERE block_key=?", [(key,) for key in cached_keys])
+		queries = []
+		self.con.set_trace_callback(queries.append)
+		self.assertEqual(bs.get_blocks(blocks), blocks)
+		self.assertEqual(len(queries), 1) # for the uncached keys
+		queries.clear()
+		self.assertEqual(bs.get_blocks(blocks), blocks) # now everything is cached
+		self.assertEqual(queries, [])
+
+	def test_get_blocks_missing(self):
+		blocks = {f"key{i}".encode(): f"val{i}".encode() for i in range(20)}
+		self.bs.put_blocks(blocks.items())
+		self.bs.GET_BLOCKS_CHUNK_SIZE = 7
+		self.assertRaises(KeyError, self.bs.get_blocks, [b"nothing"] + list(blocks))
+		self.assertRaises(KeyError, self.bs.get_blocks, list(blocks) + [b"nothing"]) # in the last chunk
+		self.assertEqual(self.bs.get_blocks([]), {})
+
+class OverlayBlockStoreTestCase(unittest.TestCase):
+	def setUp(self):
+		self.con = sqlite3.connect(":memory:")
+		self.upper = SqliteBlockStore(self.con)
+		self.lower = MemoryBlockStore()
+		self.bs = OverlayBlockStore(self.upper, self.lower)
+		self.upper.put_block(b"upper", b"u")
+		self.lower.put_block(b"lower", b"l")
+
+	def tearDown(self):
+		self.con.close()
+
+	def test_get_block(self):
+		self.assertEqual(self.bs.get_block(b"upper"), b"u")
+		self.assertEqual(self.bs.get_block(b"lower"), b"l")
+		self.assertRaises(KeyError, self.bs.get_block, b"nothing")
+		self.assertEqual(self.bs._get_block_or_none(b"lower"), b"l")
+		self.assertIsNone(self.bs._get_block_or_none(b"nothing"))
+
+	def test_upper_hit_is_one_query(self):
+		queries = []
+		self.con.set_trace_callback(queries.append)
+		self.assertEqual(self.bs.get_block(b"upper"), b"u")
+		self.assertEqual(len(queries), 1)
+
+if __name__ == '__main__':
+	unittest.main(module="tests.test_blockstore")
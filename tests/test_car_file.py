@@ -0,0 +1,65 @@
+import unittest
+import tempfile
+import io
+import mmap
+
+from atmst.blockstore.car_file import ReadOnlyCARBlockStore, encode_varint
+from cbrrr import encode_dag_cbor, CID
+
+def build_car() -> bytes:
+	blocks = [encode_dag_cbor({"hello": i}) for i in range(10)]
+	cids = [CID.cidv1_dag_cbor_sha256_32_from(block) for block in blocks]
+	header = encode_dag_cbor({"version": 1, "roots": [cids[0]]})
+	car = encode_varint(len(header)) + header
+	for cid, block in zip(cids, blocks):
+		car += encode_varint(len(bytes(cid)) + len(block)) + bytes(cid) + block
+	return car
+
+class CARFileTestCase(unittest.TestCase):
+	def setUp(self):
+		self.car = build_car()
+		# flip a bit in the last byte of the last block's payload
+		self.bad_car = self.car[:-1] + bytes([self.car[-1] ^ 1])
+
+	def open_car(self, car: bytes, use_mmap: bool) -> ReadOnlyCARBlockStore:
+		if not use_mmap:
+			return ReadOnlyCARBlockStore(io.BytesIO(car))
+		f = tempfile.TemporaryFile()
+		self.addCleanup(f.close)
+		f.write(car)
+		f.flush()
+		bs = ReadOnlyCARBlockStore(f)
+		self.assertIsInstance(bs.buf, mmap.mmap)
+		return bs
+
+	def test_verify_all(self):
+		for use_mmap in [True, False]:
+			with self.subTest(use_mmap=use_mmap):
+				bs = self.open_car(self.car, use_mmap)
+				self.assertEqual(len(bs.block_offsets), 10)
+				bs.verify_all()
+				self.assertEqual(bs.verified, set(bs.block_offsets))
+				for key in bs.block_offsets:
+					self.assertEqual(CID.cidv1_dag_cbor_sha256_32_from(bs.get_block(key)), CID(key))
+
+	def test_verify_all_bad_hash(self):
+		for use_mmap in [True, False]:
+			with self.subTest(use_mmap=use_mmap):
+				bs = self.open_car(self.bad_car, use_mmap)
+				self.assertRaises(ValueError, bs.verify_all)
+				self.assertEqual(bs.verified, set())
+				self.assertRaises(ValueError, bs.get_block, list(bs.block_offsets)[-1])
+
+	def test_close(self):
+		for car in [self.car, self.bad_car]:
+			with self.open_car(car, use_mmap=True) as bs:
+				try:
+					bs.verify_all()
+				except ValueError:
+					pass # should still be closeable after a failed verification
+			self.assertTrue(bs.buf.closed)
+		with self.open_car(self.car, use_mmap=False) as bs: # nothing to release, but it should still work
+			bs.verify_all()
+
+if __name__ == '__main__':
+	unittest.main(module="tests.test_car_file")
@@ -1,10 +1,26 @@
 import unittest
 import random
+import functools
 
 from atmst.all import MemoryBlockStore, NodeStore, NodeWrangler, mst_diff, very_slow_mst_diff
 from atmst.mst.node import MSTNode
 from cbrrr import CID
 
+DUMMY_VALUE = CID.cidv1_dag_cbor_sha256_32_from(b"value")
+
+@functools.lru_cache(maxsize=None) # the same keys get used by every test case
+def perfect_tree_keys() -> tuple:
+	keys = []
+	i = 0
+	for height in [0, 1, 0, 2, 0, 1, 0]: # if all these keys are added to a MST, it'll form a perfect binary tree.
+		while True:
+			key = f"k/{i:02d}"
+			i += 1
+			if MSTNode.key_height(key) == height:
+				keys.append(key)
+				break
+	return tuple(keys)
+
 def dump_mst(ns: NodeStore, cid: CID, lvl=0):
 	node = ns.get_node(cid)
 	print("  "*lvl + "-", node)
@@ -14,16 +30,7 @@ def dump_mst(ns: NodeStore, cid: CID, lvl=0):
 
 class MSTDiffTestCase(unittest.TestCase):
 	def setUp(self):
-		keys = []
-		dummy_value = CID.cidv1_dag_cbor_sha256_32_from(b"value")
-		i = 0
-		for height in [0, 1, 0, 2, 0, 1, 0]: # if all these keys are added to a MST, it'll form a perfect binary tree.
-			while True:
-				key = f"k/{i:02d}"
-				i += 1
-				if MSTNode.key_height(key) == height:
-					keys.append(key)
-					break
+		keys = perfect_tree_keys()
 
 		#print(keys)
 
@@ -35,11 +42,12 @@ class MSTDiffTestCase(unittest.TestCase):
 		# the idea is that this'll cover most "interesting" trees up to a height of 3
 
 		self.trees = []
+		empty_root_cid = self.ns.get_node(None).cid
 		for i in range(2**len(keys)):
-			root = self.ns.get_node(None).cid
+			root = empty_root_cid
 			for j, k in enumerate(keys):
 				if (i>>j)&1:
-					root = wrangler.put_record(root, k, dummy_value)
+					root = wrangler.put_record(root, k, DUMMY_VALUE)
 			self.trees.append(root)
 	
 	def test_diff_all_pairs(self):
@@ -57,20 +65,21 @@ class MSTDiffTestCase(unittest.TestCase):
 		wrangler = NodeWrangler(self.ns)
 
 		keys = [str(x) for x in range(1000)]
+		vals = {k: CID.cidv1_dag_cbor_sha256_32_from(k.encode()) for k in keys} # same values for every insertion order
 
 		mst_a = MSTNode.empty_root().cid
 		mst_b = MSTNode.empty_root().cid
 		mst_c = MSTNode.empty_root().cid
 
 		for k in keys:
-			mst_a = wrangler.put_record(mst_a, k, CID.cidv1_dag_cbor_sha256_32_from(k.encode()))
+			mst_a = wrangler.put_record(mst_a, k, vals[k])
 
 		for k in keys[::-1]:
-			mst_b = wrangler.put_record(mst_b, k, CID.cidv1_dag_cbor_sha256_32_from(k.encode()))
+			mst_b = wrangler.put_record(mst_b, k, vals[k])
 
 		random.shuffle(keys)
 		for k in keys:
-			mst_c = wrangler.put_record(mst_c, k, CID.cidv1_dag_cbor_sha256_32_from(k.encode()))
+			mst_c = wrangler.put_record(mst_c, k, vals[k])
 
 		#print()
 		#dump_mst(self.ns, mst_a)
@@ -81,5 +90,58 @@ class MSTDiffTestCase(unittest.TestCase):
 		self.assertEqual(mst_a, mst_b)
 		self.assertEqual(mst_a, mst_c)
 
+	def test_random_put_delete(self):
+		wrangler = NodeWrangler(self.ns)
+		rng = random.Random(1337) # seeded, so that failures are reproducible
+		empty_root_cid = MSTNode.empty_root().cid
+
+		keys = [f"k/{i:03d}" for i in range(200)]
+		vals = {k: CID.cidv1_dag_cbor_sha256_32_from(k.encode()) for k in keys}
+
+		root = empty_root_cid
+		present = set()
+		for i in range(2000):
+			k = rng.choice(keys)
+			if k in present and rng.random() < 0.6:
+				root = wrangler.del_record(root, k)
+				present.remove(k)
+			elif k not in present and rng.random() < 0.2:
+				# deleting a key that isn't there should leave the tree as-is
+				self.assertEqual(wrangler.del_record(root, k), root)
+			else:
+				root = wrangler.put_record(root, k, vals[k])
+				present.add(k)
+
+			if i % 100 == 0: # compare against a tree built from just the surviving keys
+				expected = empty_root_cid
+				for k in sorted(present):
+					expected = wrangler.put_record(expected, k, vals[k])
+				self.assertEqual(root, expected)
+
+		# and finally, deleting everything should get us back to the empty tree
+		for k in present:
+			root = wrangler.del_record(root, k)
+		self.assertEqual(root, empty_root_cid)
+
+class MSTDiffMalformedTestCase(unittest.TestCase):
+	def setUp(self):
+		self.ns = NodeStore(MemoryBlockStore())
+		self.empty_root = self.ns.get_node(None).cid
+		# a height-1 node, placed where a height-0 node should be
+		misplaced = self.ns.stored_node(MSTNode(keys=("k/02",), vals=(DUMMY_VALUE,), subtrees=(None, None)))
+		self.malformed_root = self.ns.stored_node(MSTNode(keys=("k/03",), vals=(DUMMY_VALUE,), subtrees=(misplaced.cid, None))).cid
+
+	def test_diff_against_empty(self):
+		for a, b in [(self.empty_root, self.malformed_root), (self.malformed_root, self.empty_root)]:
+			self.assertRaises(ValueError, very_slow_mst_diff, self.ns, a, b)
+			self.assertRaises(ValueError, mst_diff, self.ns, a, b)
+
+	def test_diff_small_subtrees(self):
+		# both roots are at height 1, so they get compared as "small" subtrees
+		valid_root = self.ns.stored_node(MSTNode(keys=("k/03",), vals=(DUMMY_VALUE,), subtrees=(None, None))).cid
+		for a, b in [(valid_root, self.malformed_root), (self.malformed_root, valid_root)]:
+			self.assertRaises(ValueError, very_slow_mst_diff, self.ns, a, b)
+			self.assertRaises(ValueError, mst_diff, self.ns, a, b)
+
 if __name__ == '__main__':
 	unittest.main(module="tests.test_mst_diff")
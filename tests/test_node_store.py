@@ -0,0 +1,53 @@
+import unittest
+
+from atmst.all import MemoryBlockStore, NodeStore, NodeWrangler, NodeWalker
+from cbrrr import CID
+
+DUMMY_VALUE = CID.cidv1_dag_cbor_sha256_32_from(b"value")
+
+class CountingBlockStore(MemoryBlockStore):
+	def __init__(self) -> None:
+		super().__init__()
+		self.get_blocks_calls = []
+
+	def get_blocks(self, keys):
+		keys = list(keys)
+		self.get_blocks_calls.append(keys)
+		return super().get_blocks(keys)
+
+class NodeStoreTestCase(unittest.TestCase):
+	def setUp(self):
+		self.bs = CountingBlockStore()
+		ns = NodeStore(self.bs)
+		wrangler = NodeWrangler(ns)
+		root = ns.get_node(None).cid
+		for i in range(500):
+			root = wrangler.put_record(root, f"k/{i:04d}", DUMMY_VALUE)
+		self.cids = list(NodeWalker(ns, root).iter_node_cids())
+		self.assertGreater(len(self.cids), 20)
+
+	def test_get_nodes(self):
+		ns = NodeStore(self.bs) # fresh, empty caches
+		cached = self.cids[:5]
+		for cid in cached:
+			ns.get_node(cid)
+		cids = self.cids + self.cids[:10] # with some duplicates
+		nodes = ns.get_nodes(cids)
+		self.assertEqual([node.cid for node in nodes], cids) # in the same order as requested
+		self.assertEqual(len(self.bs.get_blocks_calls), 1) # in a single batch
+		fetched = self.bs.get_blocks_calls[0]
+		self.assertFalse(set(fetched) & {bytes(cid) for cid in cached})
+
+	def test_get_nodes_bigger_than_cache(self):
+		ns = NodeStore(self.bs, cache_size=2, upper_cache_size=2)
+		nodes = ns.get_nodes(self.cids)
+		self.assertEqual([node.cid for node in nodes], self.cids)
+
+	def test_get_nodes_missing(self):
+		ns = NodeStore(self.bs)
+		missing = CID.cidv1_dag_cbor_sha256_32_from(b"nothing")
+		self.assertRaises(KeyError, ns.get_nodes, self.cids + [missing])
+		self.assertEqual(ns.get_nodes([]), [])
+
+if __name__ == '__main__':
+	unittest.main(module="tests.test_node_store")
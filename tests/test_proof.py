@@ -0,0 +1,69 @@
+import unittest
+
+from atmst.all import MemoryBlockStore, NodeStore, NodeWrangler, NodeWalker
+from atmst.mst.proof import (
+	InvalidProof, build_inclusion_proof, build_exclusion_proof,
+	verify_inclusion_batch, verify_exclusion_batch
+)
+from cbrrr import CID
+
+DUMMY_VALUE = CID.cidv1_dag_cbor_sha256_32_from(b"value")
+
+class ProofTestCase(unittest.TestCase):
+	def setUp(self):
+		self.ns = NodeStore(MemoryBlockStore())
+		wrangler = NodeWrangler(self.ns)
+		self.root = self.ns.get_node(None).cid # (this also stores the empty node)
+		for i in range(0, 1000, 2): # even keys only, so that the odd ones are absent
+			self.root = wrangler.put_record(self.root, f"k/{i:04d}", DUMMY_VALUE)
+		# for the tests to be meaningful, the lookups need to descend a few levels
+		self.assertGreaterEqual(self.ns.get_node(self.root).definitely_height(), 2)
+
+	def test_inclusion_batch(self):
+		# descending order, so each lookup is "behind" where the previous one left the walker
+		verify_inclusion_batch(self.ns, self.root, ["k/0998", "k/0500", "k/0000", "k/0500"])
+
+	def test_exclusion_batch(self):
+		verify_exclusion_batch(self.ns, self.root, ["k/0999", "k/0501", "k/0001", "a", "z"])
+
+	def test_inclusion_batch_failure(self):
+		with self.assertRaisesRegex(InvalidProof, "k/0501"):
+			verify_inclusion_batch(self.ns, self.root, ["k/0998", "k/0501", "k/0000"])
+
+	def test_exclusion_batch_failure(self):
+		with self.assertRaisesRegex(InvalidProof, "k/0500"):
+			verify_exclusion_batch(self.ns, self.root, ["k/0999", "k/0500", "k/0001"])
+
+	def test_batch_with_proof_blocks_only(self):
+		present = ["k/0998", "k/0500", "k/0000"]
+		absent = ["k/0999", "k/0501", "k/0001"]
+		proof = set()
+		for rpath in present:
+			proof |= build_inclusion_proof(self.ns, self.root, rpath)
+		for rpath in absent:
+			proof |= build_exclusion_proof(self.ns, self.root, rpath)
+		bs = MemoryBlockStore()
+		for cid in proof:
+			bs.put_block(bytes(cid), self.ns.get_node(cid).serialised)
+		ns = NodeStore(bs)
+		verify_inclusion_batch(ns, self.root, present)
+		verify_exclusion_batch(ns, self.root, absent)
+		# lookups that stray outside the proof hit missing blocks
+		self.assertRaises(InvalidProof, verify_inclusion_batch, ns, self.root, present + ["k/0250"])
+
+	def test_rewind(self):
+		walker = NodeWalker(self.ns, self.root)
+		self.assertEqual(walker.find_rpath("k/0998"), DUMMY_VALUE)
+		self.assertGreater(len(walker.stack), 1) # we're deep in the tree now
+		walker.rewind()
+		self.assertEqual(len(walker.stack), 1)
+		self.assertEqual(walker.find_rpath("k/0000"), DUMMY_VALUE)
+		# rewinding works even after walking off the end of the tree
+		for _ in walker.iter_kv():
+			pass
+		self.assertRaises(StopIteration, walker.right_or_up)
+		walker.rewind()
+		self.assertEqual(list(walker.iter_kv()), list(NodeWalker(self.ns, self.root).iter_kv()))
+
+if __name__ == '__main__':
+	unittest.main(module="tests.test_proof")
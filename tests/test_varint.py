@@ -1,7 +1,7 @@
 import unittest
 import io
 
-from atmst.blockstore.car_file import decode_varint, encode_varint
+from atmst.blockstore.car_file import decode_varint, decode_varint_at, encode_varint
 
 class MSTDiffTestCase(unittest.TestCase):
 	def test_varint_encode(self):
@@ -24,5 +24,29 @@ class MSTDiffTestCase(unittest.TestCase):
 		self.assertRaises(ValueError, decode_varint, io.BytesIO(b'\xff')) # truncated
 		self.assertRaises(ValueError, decode_varint, io.BytesIO(b"\x80\x00")) # not minimally encoded
 
+	def test_varint_decode_too_long_fails_fast(self):
+		stream = io.BytesIO(b"\xff" * 16)
+		self.assertRaises(ValueError, decode_varint, stream)
+		self.assertEqual(stream.tell(), 9) # gave up without reading a 10th byte
+
+	def test_varint_decode_buffer(self):
+		self.assertEqual(decode_varint(b"\x00"), 0)
+		self.assertEqual(decode_varint(b"\x7f"), 127)
+		self.assertEqual(decode_varint(b"\x80\x01"), 128)
+		self.assertEqual(decode_varint(bytearray(b"\x80\x01")), 128)
+		self.assertEqual(decode_varint(memoryview(b"\x80\x01\xff")), 128) # trailing bytes are ignored
+		self.assertEqual(decode_varint(b'\xff\xff\xff\xff\xff\xff\xff\xff\x7f'), 2**63-1)
+		self.assertRaises(ValueError, decode_varint, b'\xff\xff\xff\xff\xff\xff\xff\xff\xff\x7f') # too big
+		self.assertRaises(ValueError, decode_varint, b"") # too short
+		self.assertRaises(ValueError, decode_varint, b'\xff') # truncated
+		self.assertRaises(ValueError, decode_varint, b"\x80\x00") # not minimally encoded
+
+	def test_varint_decode_at(self):
+		buf = b"\x01\x80\x01\x7f"
+		self.assertEqual(decode_varint_at(buf), (1, 1))
+		self.assertEqual(decode_varint_at(buf, 1), (128, 3))
+		self.assertEqual(decode_varint_at(buf, 3), (127, 4))
+		self.assertRaises(ValueError, decode_varint_at, buf, 4) # nothing left
+
 if __name__ == '__main__':
 	unittest.main(module="tests.test_varint")